@@ -0,0 +1,59 @@
+from cache import memorizar
+from diagnostico import medir
+
+# pypfopt, scipy e os módulos de otimização são importados dentro das funções, só quando a etapa é usada
+
+
+# Retornos diários a partir da matriz de preços
+@medir('retornos')
+@memorizar
+def retornos_diarios(precos):
+    from pypfopt import expected_returns
+    return expected_returns.returns_from_prices(precos)
+
+
+# Retorno esperado anualizado (média histórica composta) de cada ativo
+@medir('retorno_esperado')
+@memorizar
+def retorno_esperado(precos, frequencia=252):
+    from pypfopt import expected_returns
+    return expected_returns.mean_historical_return(retornos_diarios(precos), returns_data=True, compounding=True, frequency=frequencia)
+
+
+# Matriz de covariância anualizada dos retornos
+@medir('covariancia')
+@memorizar
+def matriz_covariancia(precos, metodo='sample_cov', frequencia=252):
+    from pypfopt import risk_models
+    return risk_models.risk_matrix(retornos_diarios(precos), method=metodo, returns_data=True, frequency=frequencia)
+
+
+# Matriz de correlação derivada da matriz de covariância
+@medir('correlacao')
+@memorizar
+def matriz_correlacao(precos, metodo='sample_cov', frequencia=252):
+    from pypfopt import risk_models
+    return risk_models.cov_to_corr(matriz_covariancia(precos, metodo, frequencia))
+
+
+# Fronteira eficiente completa (grade de alvos + mínima volatilidade, máximo Sharpe e tangente)
+@medir('otimizacao.fronteira')
+@memorizar
+def fronteira_eficiente(precos, n_pontos=50, tipo='retorno', taxa_livre_risco=0.0):
+    import fronteira
+    return fronteira.calcular_fronteira(retorno_esperado(precos), matriz_covariancia(precos), n_pontos=n_pontos, tipo=tipo, taxa_livre_risco=taxa_livre_risco)
+
+
+# Backtest walk-forward da estratégia contra a carteira de pesos iguais
+@medir('otimizacao.backtest')
+@memorizar
+def backtest_walk_forward(precos, janela=252, frequencia=21, aversao=None):
+    import backtest
+    return backtest.backtest_walk_forward(precos, janela=janela, frequencia=frequencia, aversao=aversao)
+
+
+# Universo grande: covariância com shrinkage, clusterização e pesos HRP, reaproveitados entre execuções
+@memorizar
+def universo_grande(precos):
+    import universo
+    return universo.UniversoGrande(precos)
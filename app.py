@@ -1,20 +1,25 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import yfinance as yf
-from pandas_datareader import data as wb
-from pypfopt import efficient_frontier, risk_models, expected_returns, plotting, cla, hierarchical_portfolio
 import plotly.graph_objects as go
-from prophet import Prophet
-from scipy.cluster.hierarchy import linkage, dendrogram
 import datetime
+from dados import armazem_padrao, baixar_precos
+import analise
+import universo
+import graficos
+import diagnostico
+from nucleo import LIMITE_UNIVERSO_GRANDE
 
-# Configurar o uso do Alpha Vantage
-yf.pdr_override()
+# Prophet, pypfopt, scipy e yfinance são importados só quando a seção que os usa é executada
 
 # DataFrame para armazenar os dados
 if 'newdata' not in st.session_state:
     st.session_state.newdata = pd.DataFrame()
+if 'universo_grande' not in st.session_state:
+    st.session_state.universo_grande = False
+
+# Armazém local de preços (Parquet), que busca na fonte apenas os intervalos ainda não baixados
+armazem = armazem_padrao()
 
 # Lista de tickers das 40 ações mais recorrentes da B3
 top_40_tickers = ['BBDC4.SA', 'PETR4.SA', 'MGLU3.SA', 'CIEL3.SA', 'ABEV3.SA', 'ITUB4.SA', 'VALE3.SA', 'WEGE3.SA', 'BBAS3.SA', 'PETR3.SA',
@@ -24,94 +29,150 @@ top_40_tickers = ['BBDC4.SA', 'PETR4.SA', 'MGLU3.SA', 'CIEL3.SA', 'ABEV3.SA', 'I
 
 # Função para obter os dados para os tickers selecionados e reiniciar a aplicação
 def obter_dados(start_date, end_date, selected_tickers):
-    st.session_state.newdata = pd.DataFrame()
+    # Download em paralelo; falhas de um ticker não interrompem os demais
+    st.session_state.newdata, falhas, tempos = baixar_precos(armazem, selected_tickers, start_date, end_date)
 
-    try:
-        for t in selected_tickers:
-            data = wb.get_data_yahoo(t, start=start_date, end=end_date)['Adj Close']
-            if len(data) > 0:  # Check if there is data for the asset
-                st.session_state.newdata[t] = data
+    for t, erro in falhas.items():
+        st.error(f"Erro ao obter os dados de {t}: {erro}")
 
-    except Exception as e:
-        st.error(f"Erro ao obter os dados: {e}")
-        return
+    if tempos:
+        with st.expander("Tempo de download por ativo"):
+            st.dataframe(pd.Series(tempos, name="Segundos").sort_values(ascending=False))
 
     if st.session_state.newdata.empty:
         st.warning("Nenhum dado disponível para os ativos selecionados.")
         return
 
-    # Update the portfolio calculation result
-    calcular_portfolio_eficiente(st.session_state.newdata)
+    # No modo universo grande os preços ficam em float32 e a fronteira (QP denso) não é calculada
+    if st.session_state.universo_grande:
+        st.session_state.newdata = st.session_state.newdata.astype(np.float32)
 
 # Função para adicionar os tickers selecionados na lista 'selected_tickers'
 def update_tickers(selected_tickers, ticker_vars):
     selected_tickers = [ticker_var.get() for ticker_var in ticker_vars if ticker_var.get()]
     return selected_tickers
 
-# Função para calcular o portfólio eficiente e exibir o resultado em uma caixa de diálogo
-def calcular_portfolio_eficiente(data):
-    matriz = risk_models.sample_cov(data)
-    retorno = expected_returns.mean_historical_return(data, compounding=True, frequency=252)
-
-    ef = efficient_frontier.EfficientFrontier(retorno, matriz, weight_bounds=(0, 1))
+# Função para calcular a fronteira eficiente e exibir o gráfico e os portfólios de destaque
+def calcular_portfolio_eficiente(data, taxa_livre_risco=0.0):
     try:
-        weights = ef.efficient_return(target_return=0.5)
-        retorno_esperado = ef.portfolio_performance()[0]
-        volatilidade = ef.portfolio_performance()[1]
-        indice_sharpe = ef.portfolio_performance()[2]
-
-        st.subheader("Resultado do Portfólio Eficiente")
-        st.write("Retorno esperado do portfólio:", round(retorno_esperado, 4))
-        st.write("Volatilidade do portfólio:", round(volatilidade, 4))
-        st.write("Índice de Sharpe do portfólio:", round(indice_sharpe, 4))
-
+        resultado = analise.fronteira_eficiente(data, n_pontos=50, taxa_livre_risco=taxa_livre_risco)
     except ValueError as ve:
         st.error(str(ve))
+        return
+
+    pontos = resultado['pontos']
+    destaques = {'Mínima Volatilidade': resultado['min_volatilidade'], 'Máximo Sharpe': resultado['max_sharpe']}
+    if taxa_livre_risco > 0:
+        destaques['Tangente'] = resultado['tangente']
+    destaques = {nome: p for nome, p in destaques.items() if p is not None}
+
+    st.subheader("Resultado do Portfólio Eficiente")
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=pontos['volatilidade'], y=pontos['retorno'], mode='lines', name='Fronteira Eficiente',
+                             customdata=pontos['sharpe'], hovertemplate="Volatilidade: %{x:.4f}<br>Retorno: %{y:.4f}<br>Sharpe: %{customdata:.4f}"))
+    fig.add_trace(go.Scatter(x=np.sqrt(np.diag(analise.matriz_covariancia(data))), y=analise.retorno_esperado(data), mode='markers+text',
+                             text=data.columns, textposition='top center', name='Ativos'))
+    for nome, p in destaques.items():
+        fig.add_trace(go.Scatter(x=[p['volatilidade']], y=[p['retorno']], mode='markers', marker=dict(size=12, symbol='star'), name=nome))
+    fig.update_layout(title_text="Fronteira Eficiente", xaxis_title="Volatilidade", yaxis_title="Retorno Esperado")
+    st.plotly_chart(fig)
+    if resultado['descartados']:
+        st.warning(f"{resultado['descartados']} de 50 pontos da fronteira não convergiram e ficaram fora do gráfico.")
+
+    st.write(pd.DataFrame(destaques).T.round(4))
 
 # Função para exibir o gráfico da série de preços de fechamento de ações
 def exibir_serie_precos(data):
-    fig = go.Figure()
-    for column in data.columns:
-        fig.add_trace(go.Scatter(x=data.index, y=data[column], mode='lines', name=column))
-    fig.update_layout(title_text="Séries de preços de fechamentos de ações", xaxis_title="Data", yaxis_title="Preço de Fechamento")
+    # Cada série é reduzida (LTTB) ao intervalo escolhido, então aproximar o período traz mais detalhe
+    inicio, fim = data.index.min().date(), data.index.max().date()
+    intervalo = (None, None)
+    if inicio < fim:
+        intervalo = st.slider("Intervalo visível:", min_value=inicio, max_value=fim, value=(inicio, fim))
+    fig = graficos.figura_series(data, "Séries de preços de fechamentos de ações", "Preço de Fechamento", intervalo=intervalo)
     st.plotly_chart(fig)
 
 # Função para exibir o gráfico do retorno esperado
 def exibir_retorno_esperado(data):
-    retorno_esperado = expected_returns.mean_historical_return(data, returns_data=False, compounding=True, frequency=252)
+    retorno_esperado = analise.retorno_esperado(data)
     fig = go.Figure(go.Bar(x=retorno_esperado.index, y=retorno_esperado.values * 100))
     fig.update_layout(title_text="Retorno Esperado para cada Ativo", xaxis_title="Ativo", yaxis_title="Retorno Esperado (%)")
     st.plotly_chart(fig)
 
 # Função para calcular a matriz de covariância e exibir o gráfico
 def calcular_matriz_covariancia():
-    matriz_cov = risk_models.risk_matrix(st.session_state.newdata, method='sample_cov')
-    fig = plotting.plot_covariance(matriz_cov, plot_correlation=True)
+    from pypfopt import plotting
+    matriz_corr = analise.matriz_correlacao(st.session_state.newdata)
+    with diagnostico.etapa('graficos.covariancia'):
+        fig = plotting.plot_covariance(matriz_corr, plot_correlation=False)
     st.pyplot(fig.figure)
 
-# Função para prever os preços usando o modelo Prophet
-def prever_precos(ticker, num_dias):
-    data = wb.get_data_yahoo(ticker)['Adj Close'].reset_index()
-    data.columns = ['ds', 'y']
+# Função para exibir a alocação por paridade de risco hierárquica (HRP) e o dendrograma dos ativos
+def exibir_hrp(data):
+    resultado = analise.universo_grande(data)
+    pesos = resultado.pesos_hrp().sort_values(ascending=False)
 
-    # Criar o modelo Prophet
-    model = Prophet(daily_seasonality=True)
-    model.fit(data)
+    st.write("Intensidade do shrinkage (Ledoit-Wolf):", round(resultado.intensidade_shrinkage, 4))
+    st.write(f"Ativos na análise: {len(resultado.tickers)} de {data.shape[1]}")
+    if resultado.excluidos:
+        st.caption("Fora da análise por terem poucos preços no período: " + ", ".join(resultado.excluidos))
+    fig = go.Figure(go.Bar(x=pesos.index[:30], y=pesos.values[:30] * 100))
+    fig.update_layout(title_text="Maiores Pesos da Alocação HRP", xaxis_title="Ativo", yaxis_title="Peso (%)")
+    st.plotly_chart(fig)
+    st.pyplot(resultado.dendrograma())
 
-    # Criar dataframe para as datas futuras
-    futuras_datas = model.make_future_dataframe(periods=num_dias)
-    
-    # Fazer a previsão
-    previsao = model.predict(futuras_datas)
+    st.download_button("Baixar pesos HRP (CSV)", pesos.to_csv().encode('utf-8'), file_name="pesos_hrp.csv")
 
-    # Filtrar as datas para os dias desejados
-    previsao_ticker = previsao.tail(num_dias) if num_dias > 0 else None
+# Função para executar o backtest walk-forward e exibir retorno acumulado, drawdown e resumo
+def exibir_backtest(data, janela, frequencia, aversao):
+    try:
+        resultado = analise.backtest_walk_forward(data, janela=janela, frequencia=frequencia, aversao=aversao)
+    except ValueError as ve:
+        st.error(str(ve))
+        return
+
+    nomes = {'estrategia': 'Estratégia', 'peso_igual': 'Pesos Iguais'}
+    for chave, titulo, eixo in (('acumulado', "Retorno Acumulado", "Valor da Carteira"), ('drawdown', "Drawdown", "Drawdown")):
+        st.plotly_chart(graficos.figura_series(resultado[chave], titulo, eixo, nomes=nomes))
+
+    st.write(resultado['resumo'].rename(columns=nomes).round(4))
+
+# Função para prever os preços usando o modelo Prophet, a partir dos preços já carregados
+def prever_precos(ticker, num_dias):
+    return carregar_previsao().prever(st.session_state.newdata[ticker], num_dias)
+
+# Importa o módulo de previsão (e o Prophet) apenas quando uma previsão é pedida
+def carregar_previsao():
+    with diagnostico.etapa('importacao.prophet'):
+        import previsao
+    return previsao
 
-    return previsao_ticker
+# Função para exibir o painel de diagnóstico com tempo, memória e chamadas de cada etapa
+def exibir_diagnostico():
+    from cache import cache_global
+    st.subheader("Diagnóstico")
+    resumo = diagnostico.registro.resumo()
+    if resumo.empty:
+        st.write("Nenhuma etapa registrada ainda.")
+    else:
+        st.dataframe(resumo.round(4))
+    st.write(f"Cache de análises: {len(cache_global.itens)} itens, {cache_global.acertos} acertos, {cache_global.falhas} falhas")
+    st.download_button("Exportar diagnóstico (JSON)", diagnostico.registro.exportar_json().encode('utf-8'), file_name="diagnostico.json")
+    if st.button("Limpar diagnóstico"):
+        diagnostico.registro.limpar()
 
 # Layout da interface gráfica
 st.title("Análise de Portfólio")
 
+# Diagnóstico opcional; a medição de memória (tracemalloc) precisa ser ligada antes das etapas rodarem.
+# Ela vale para o processo inteiro (todas as sessões) e, uma vez ligada, só termina quando o servidor reinicia.
+mostrar_diagnostico = st.sidebar.checkbox("Mostrar diagnóstico")
+if mostrar_diagnostico:
+    memoria_ativa = diagnostico.memoria_ativa()
+    if st.sidebar.checkbox("Medir memória (mais lento)", value=memoria_ativa, disabled=memoria_ativa):
+        diagnostico.ativar_memoria()
+    if memoria_ativa:
+        st.sidebar.caption("A medição de memória está ligada para todas as sessões até o servidor reiniciar.")
+
 # Campo de entrada para a data de início
 start_date = st.date_input("INÍCIO:", pd.to_datetime('2022-01-03'))
 
@@ -121,12 +182,26 @@ end_date = st.date_input("FIM:", datetime.datetime.now())
 # Checkboxes para selecionar os tickers
 selected_tickers = st.multiselect("Selecione os tickers:", top_40_tickers, default=top_40_tickers[:5])
 
+# Arquivo com uma lista de tickers (centenas ou milhares), que substitui a seleção acima
+arquivo_tickers = st.file_uploader("Ou carregue um arquivo com a lista de tickers:", type=['txt', 'csv'])
+if arquivo_tickers is not None:
+    selected_tickers = universo.ler_tickers(arquivo_tickers)
+    st.caption(f"{len(selected_tickers)} tickers carregados do arquivo.")
+
+# Taxa livre de risco usada no portfólio tangente
+taxa_livre_risco = st.number_input("Taxa livre de risco anual:", min_value=0.0, max_value=1.0, value=0.0, step=0.005, format="%.3f")
+
 # Botão para obter os dados
 if st.button("Gerar"):
+    st.session_state.universo_grande = len(selected_tickers) > LIMITE_UNIVERSO_GRANDE
     obter_dados(start_date, end_date, selected_tickers)
 
 # Área para mostrar os gráficos
 if not st.session_state.newdata.empty:
+    # A fronteira é memorizada pelos preços, então redesenhá-la a cada execução só refaz o gráfico
+    # e uma nova taxa livre de risco atualiza o portfólio tangente sem precisar clicar em Gerar
+    if not st.session_state.universo_grande:
+        calcular_portfolio_eficiente(st.session_state.newdata, taxa_livre_risco)
     if st.button("Informações sobre Série de Preços"):
         st.info("O gráfico de série de preços é uma ferramenta fundamental na análise de ativos financeiros, como ações, títulos e moedas. Ele representa a evolução dos preços de fechamento de um ativo ao longo do tempo. Cada ponto no gráfico representa o preço de fechamento do ativo em um determinado dia, e a linha que conecta esses pontos mostra a tendência de variação dos preços.\n\nAo analisar o gráfico de série de preços, podemos identificar padrões, tendências e movimentos significativos do ativo. Por exemplo, podemos observar se o ativo está em uma tendência de alta (quando os preços estão subindo consistentemente) ou em uma tendência de baixa (quando os preços estão caindo consistentemente). Além disso, podemos identificar momentos de volatilidade, ou seja, períodos em que os preços têm variações bruscas e imprevisíveis.\n\nOutro aspecto importante do gráfico de série de preços é a presença de suportes e resistências. Suportes são níveis de preços em que o ativo tende a parar de cair e começa a subir novamente, enquanto resistências são níveis de preços em que o ativo tende a parar de subir e começa a cair novamente. Esses níveis são importantes para identificar pontos de entrada e saída de uma operação.\n\nEm resumo, o gráfico de série de preços é uma ferramenta valiosa para entender o comportamento passado do ativo e fazer projeções sobre seu desempenho futuro. É uma das principais ferramentas utilizadas por investidores e traders para tomar decisões informadas sobre suas operações.\n\n--------------------------------------------------------\n\nThe price series chart is a fundamental tool in the analysis of financial assets, such as stocks, bonds, and currencies. It represents the evolution of the closing prices of an asset over time. Each point on the chart represents the closing price of the asset on a specific day, and the line connecting these points shows the trend of price variation.\n\nWhen analyzing the price series chart, we can identify patterns, trends, and significant movements of the asset. For example, we can observe if the asset is in an uptrend (when prices are consistently rising) or in a downtrend (when prices are consistently falling). Additionally, we can identify moments of volatility, which are periods when prices have sharp and unpredictable variations.\n\nAnother important aspect of the price series chart is the presence of support and resistance levels. Supports are price levels at which the asset tends to stop falling and starts rising again, while resistances are price levels at which the asset tends to stop rising and starts falling again. These levels are important for identifying entry and exit points of a trade.\n\nIn summary, the price series chart is a valuable tool to understand the past behavior of the asset and make projections about its future performance. It is one of the main tools used by investors and traders to make informed decisions about their trades.\n\n")
     st.subheader("Série de Preços de Fechamentos de Ações")
@@ -137,8 +212,24 @@ if not st.session_state.newdata.empty:
     exibir_retorno_esperado(st.session_state.newdata)
     if st.button("Informações sobre Matriz de Covariância"):
         st.info("A Matriz de Covariância é uma importante ferramenta na análise de portfólios de investimento. Ela representa as relações de covariância entre os retornos de diferentes ativos do portfólio. Em outras palavras, a matriz mostra como os retornos de cada ativo se movem em relação aos retornos dos outros ativos.\n\nA importância da Matriz de Covariância está em sua capacidade de medir o grau de dependência ou interdependência entre os ativos. Quando os ativos têm covariância positiva, seus retornos tendem a se mover na mesma direção, o que pode indicar uma maior correlação entre eles. Por outro lado, quando os ativos têm covariância negativa, seus retornos tendem a se mover em direções opostas, indicando uma menor correlação.\n\nEssa informação é valiosa para os investidores, pois ajuda a entender como diferentes ativos se comportam em conjunto, o que pode afetar o risco e o retorno geral do portfólio. Uma combinação de ativos com baixa covariância pode reduzir a volatilidade do portfólio, enquanto uma combinação de ativos com alta covariância pode aumentar a diversificação e a proteção contra riscos específicos de ativos.\n\nAlém disso, a Matriz de Covariância é utilizada para calcular medidas importantes na construção de portfólios eficientes, como a fronteira eficiente e a alocação de ativos. A fronteira eficiente mostra a combinação ótima de ativos que maximiza o retorno esperado para um determinado nível de risco, enquanto a alocação de ativos determina a proporção de cada ativo no portfólio com base em seus retornos e riscos.\n\nEm resumo, a Matriz de Covariância desempenha um papel fundamental na construção de portfólios diversificados e eficientes, permitindo que os investidores tomem decisões mais informadas para alcançar seus objetivos financeiros.\n\n--------------------------------------------------------\n\nThe Covariance Matrix is an important tool in the analysis of investment portfolios. It represents the covariance relationships between the returns of different assets in the portfolio. In other words, the matrix shows how the returns of each asset move in relation to the returns of other assets.\n\nThe importance of the Covariance Matrix lies in its ability to measure the degree of dependence or interdependence between assets. When assets have positive covariance, their returns tend to move in the same direction, indicating a higher correlation between them. On the other hand, when assets have negative covariance, their returns tend to move in opposite directions, indicating a lower correlation.\n\nThis information is valuable for investors as it helps to understand how different assets behave together, which can affect the overall risk and return of the portfolio. A combination of assets with low covariance can reduce portfolio volatility, while a combination of assets with high covariance can increase diversification and protection against specific asset risks.\n\nFurthermore, the Covariance Matrix is used to calculate important measures in the construction of efficient portfolios, such as the efficient frontier and asset allocation. The efficient frontier shows the optimal combination of assets that maximizes the expected return for a given level of risk, while asset allocation determines the proportion of each asset in the portfolio based on its returns and risks.\n\nIn summary, the Covariance Matrix plays a fundamental role in constructing diversified and efficient portfolios, allowing investors to make more informed decisions to achieve their financial goals.\n\n")
-    st.subheader("Matriz de Covariância")
-    calcular_matriz_covariancia()
+    if st.session_state.universo_grande:
+        st.subheader("Alocação por Paridade de Risco Hierárquica (HRP)")
+        exibir_hrp(st.session_state.newdata)
+    else:
+        st.subheader("Matriz de Covariância")
+        calcular_matriz_covariancia()
+
+    # Backtest walk-forward com reotimização periódica
+    st.subheader("Backtest Walk-Forward")
+    janela_backtest = st.slider("Janela de estimação (dias úteis):", min_value=21, max_value=756, value=252)
+    frequencia_backtest = st.slider("Rebalancear a cada (dias úteis):", min_value=1, max_value=126, value=21)
+    estrategia_backtest = st.selectbox("Estratégia:", ["Mínima Variância", "Média-Variância"])
+    aversao_backtest = None
+    if estrategia_backtest == "Média-Variância":
+        aversao_backtest = st.number_input("Aversão ao risco:", min_value=0.1, max_value=100.0, value=5.0)
+
+    if st.button("Executar Backtest"):
+        exibir_backtest(st.session_state.newdata, janela_backtest, frequencia_backtest, aversao_backtest)
 
     # Gráfico da previsão usando o modelo Prophet
     if st.button("Informações sobre Previsão de Preços"):
@@ -154,12 +245,23 @@ if not st.session_state.newdata.empty:
 
             # Gráfico da previsão
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=st.session_state.newdata.index, y=st.session_state.newdata[selected_ticker], mode='lines', name='Dados Históricos'))
-            fig.add_trace(go.Scatter(x=previsao_ticker['ds'], y=previsao_ticker['yhat'], mode='lines', name='Previsão'))
-            fig.add_trace(go.Scatter(x=previsao_ticker['ds'], y=previsao_ticker['yhat_lower'], fill=None, mode='lines', line=dict(color='gray'), showlegend=False))
-            fig.add_trace(go.Scatter(x=previsao_ticker['ds'], y=previsao_ticker['yhat_upper'], fill='tonexty', mode='lines', line=dict(color='gray'), name='Intervalo de Confiança'))
+            graficos.adicionar_serie(fig, st.session_state.newdata[selected_ticker], 'Dados Históricos')
+            fig.add_trace(go.Scattergl(x=previsao_ticker['ds'], y=previsao_ticker['yhat'], mode='lines', name='Previsão'))
+            fig.add_trace(go.Scattergl(x=previsao_ticker['ds'], y=previsao_ticker['yhat_lower'], fill=None, mode='lines', line=dict(color='gray'), showlegend=False))
+            fig.add_trace(go.Scattergl(x=previsao_ticker['ds'], y=previsao_ticker['yhat_upper'], fill='tonexty', mode='lines', line=dict(color='gray'), name='Intervalo de Confiança'))
             fig.update_layout(title_text=f"Previsão de Preços para {selected_ticker}", xaxis_title="Data", yaxis_title="Preço de Fechamento")
             st.plotly_chart(fig)
         else:
             st.warning("Selecione uma quantidade de dias maior que 0 para gerar a previsão.")
 
+    # Previsão em lote: ajusta os modelos de todos os ativos carregados em paralelo
+    if st.button("Gerar Previsão para Todos"):
+        if num_dias_previsao > 0:
+            previsoes = carregar_previsao().prever_lote(st.session_state.newdata, num_dias_previsao)
+            st.write(pd.DataFrame({t: p.set_index('ds')['yhat'] for t, p in previsoes.items()}))
+        else:
+            st.warning("Selecione uma quantidade de dias maior que 0 para gerar a previsão.")
+
+# Painel de diagnóstico no fim do script, para incluir as etapas desta execução
+if mostrar_diagnostico:
+    exibir_diagnostico()
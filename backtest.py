@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+
+# Soma e produto cruzado dos retornos de uma janela deslizante.
+# Ao deslizar, as linhas que entram e saem são aplicadas em bloco (equivalente a uma sequência
+# de atualizações de posto 1), sem recalcular a covariância da janela inteira.
+class EstatisticasJanela:
+    def __init__(self, retornos):
+        self.n = len(retornos)
+        self.soma = retornos.sum(axis=0)
+        self.produto = retornos.T @ retornos
+
+    def deslizar(self, entrando, saindo):
+        self.soma += entrando.sum(axis=0) - saindo.sum(axis=0)
+        self.produto += entrando.T @ entrando - saindo.T @ saindo
+        self.n += len(entrando) - len(saindo)
+
+    def media(self):
+        return self.soma / self.n
+
+    def covariancia(self):
+        media = self.media()
+        return (self.produto - self.n * np.outer(media, media)) / (self.n - 1)
+
+
+# Maximiza mu'w - aversao/2 * w'Sw com pesos no simplex {w >= 0, soma(w) = 1} (aversao=None -> mínima variância)
+# pelo método de conjunto ativo primal. Partindo dos pesos do rebalanceamento anterior, com a covariância
+# mudando pouco entre uma data e outra, costuma convergir em uma ou duas resoluções de sistemas pequenos.
+def _otimizar(media, covariancia, pesos_iniciais, aversao=None, tolerancia=1e-10):
+    fator = 1.0 if aversao is None else aversao
+    linear = np.zeros_like(media) if aversao is None else media
+    n = len(media)
+    # Regularização mínima para manter o sistema inversível quando a covariância é singular
+    hessiana = fator * (covariancia + 1e-10 * np.trace(covariancia) / n * np.eye(n))
+    w = pesos_iniciais.copy()
+    fixos = w <= 0
+
+    for _ in range(10 * n):
+        livres = np.flatnonzero(~fixos)
+        gradiente = hessiana @ w - linear
+        k = len(livres)
+        sistema = np.ones((k + 1, k + 1))
+        sistema[:k, :k] = hessiana[np.ix_(livres, livres)]
+        sistema[k, k] = 0.0
+        solucao = np.linalg.solve(sistema, np.concatenate([-gradiente[livres], [0.0]]))
+        passo, nu = solucao[:k], solucao[k]
+
+        if np.abs(passo).max() <= tolerancia:
+            # Ótimo no conjunto atual: libera o peso fixo em zero com multiplicador mais negativo, se houver
+            multiplicadores = gradiente + nu
+            multiplicadores[~fixos] = np.inf
+            i = np.argmin(multiplicadores)
+            if multiplicadores[i] >= -tolerancia:
+                break
+            fixos[i] = False
+            continue
+
+        # Avança até o primeiro peso que zerar no caminho
+        razoes = np.full(k, np.inf)
+        negativos = passo < 0
+        razoes[negativos] = -w[livres][negativos] / passo[negativos]
+        j = np.argmin(razoes)
+        alfa = min(1.0, razoes[j])
+        w[livres] += alfa * passo
+        if alfa < 1.0:
+            w[livres[j]] = 0.0
+            fixos[livres[j]] = True
+
+    w = np.maximum(w, 0.0)
+    return w / w.sum()
+
+
+# Aplica os pesos em um bloco de dias sem rebalancear: retorna os retornos diários da carteira
+# e os pesos ao final do bloco (já deslocados pela variação dos preços). Pesos todos zero = carteira em caixa.
+def _manter(retornos, pesos):
+    if not pesos.any():
+        return np.zeros(len(retornos)), pesos
+    crescimento = np.cumprod(1 + retornos, axis=0)
+    valor = crescimento @ pesos
+    diarios = np.diff(np.concatenate([[1.0], valor])) / np.concatenate([[1.0], valor[:-1]])
+    return diarios, pesos * crescimento[-1] / valor[-1]
+
+
+def _drawdown(acumulado):
+    return acumulado / acumulado.cummax() - 1
+
+
+# Backtest walk-forward: a cada `frequencia` dias, reotimiza com os últimos `janela` dias de retornos
+# e compara com a carteira de pesos iguais rebalanceada no mesmo calendário.
+# aversao=None usa mínima variância; um número usa média-variância com essa aversão ao risco.
+# Lacunas no meio da série (feriado local) contam como retorno zero. Antes da listagem e depois da
+# saída da bolsa não há retorno: em cada rebalanceamento, só entram nas duas carteiras os ativos com
+# retornos em todos os dias da janela; os demais ficam com peso zero.
+def backtest_walk_forward(precos, janela=252, frequencia=21, aversao=None, frequencia_anual=252):
+    retornos = precos.ffill().where(precos.bfill().notna()).pct_change(fill_method=None).iloc[1:]
+    validos = retornos.notna().to_numpy()
+    R = retornos.fillna(0.0).to_numpy(dtype=np.float64)
+    total, n_ativos = R.shape
+    if total <= janela:
+        raise ValueError(f"São necessários mais de {janela} dias de retornos para o backtest.")
+
+    # Dias com retorno acumulados por ativo: a janela [t - janela, t) está completa quando soma `janela`
+    contagem = np.vstack([np.zeros((1, n_ativos), dtype=np.int64), np.cumsum(validos, axis=0)])
+    datas = list(range(janela, total, frequencia))
+    estatisticas = EstatisticasJanela(R[:janela])
+    pesos = np.zeros(n_ativos)
+    pesos_atuais = {'estrategia': np.zeros(n_ativos), 'peso_igual': np.zeros(n_ativos)}
+    diarios = {'estrategia': [], 'peso_igual': []}
+    turnover = {'estrategia': [], 'peso_igual': []}
+    historico_pesos = []
+
+    for i, t in enumerate(datas):
+        if i > 0:
+            anterior = datas[i - 1]
+            estatisticas.deslizar(R[anterior:t], R[anterior - janela:t - janela])
+
+        completos = np.flatnonzero(contagem[t] - contagem[t - janela] == janela)
+        igual = np.zeros(n_ativos)
+        igual[completos] = 1.0 / max(len(completos), 1)
+
+        # Otimiza só os ativos completos, partindo dos pesos anteriores restritos a eles
+        iniciais = pesos[completos]
+        iniciais = iniciais / iniciais.sum() if iniciais.sum() > 0 else igual[completos]
+        pesos = np.zeros(n_ativos)
+        if len(completos) > 0:
+            media = estatisticas.media()[completos] * frequencia_anual
+            covariancia = estatisticas.covariancia()[np.ix_(completos, completos)] * frequencia_anual
+            pesos[completos] = _otimizar(media, covariancia, iniciais, aversao)
+        historico_pesos.append(pesos)
+
+        fim = datas[i + 1] if i + 1 < len(datas) else total
+        for nome, alvo in (('estrategia', pesos), ('peso_igual', igual)):
+            turnover[nome].append(np.abs(alvo - pesos_atuais[nome]).sum())
+            bloco, pesos_atuais[nome] = _manter(R[t:fim], alvo)
+            diarios[nome].append(bloco)
+
+    indice = retornos.index[janela:]
+    diarios = pd.DataFrame({nome: np.concatenate(blocos) for nome, blocos in diarios.items()}, index=indice)
+    acumulado = (1 + diarios).cumprod()
+    drawdown = _drawdown(acumulado)
+    datas_rebalanceamento = retornos.index[datas]
+    turnover = pd.DataFrame(turnover, index=datas_rebalanceamento)
+
+    resumo = pd.DataFrame({
+        'retorno_acumulado': acumulado.iloc[-1] - 1,
+        'retorno_anual': acumulado.iloc[-1] ** (frequencia_anual / len(diarios)) - 1,
+        'volatilidade_anual': diarios.std() * np.sqrt(frequencia_anual),
+        'max_drawdown': drawdown.min(),
+        'turnover_medio': turnover.mean(),
+    }).T
+
+    return {
+        'retornos': diarios,
+        'acumulado': acumulado,
+        'drawdown': drawdown,
+        'turnover': turnover,
+        'pesos': pd.DataFrame(historico_pesos, index=datas_rebalanceamento, columns=precos.columns),
+        'resumo': resumo,
+    }
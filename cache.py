@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Impressão digital barata do conteúdo de um DataFrame/Series (valores, índice e nomes das colunas)
+def impressao_digital(obj):
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode())
+    elif isinstance(obj, pd.Series):
+        h.update(repr(obj.name).encode())
+    h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+# Converte um argumento em algo que possa fazer parte da chave do cache
+def _chave_argumento(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return ('df', impressao_digital(valor))
+    if isinstance(valor, np.ndarray):
+        return ('nd', valor.shape, hashlib.blake2b(np.ascontiguousarray(valor).tobytes(), digest_size=16).hexdigest())
+    if isinstance(valor, (list, tuple)):
+        return tuple(_chave_argumento(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _chave_argumento(v)) for k, v in valor.items()))
+    return valor
+
+
+# Cache LRU limitado em número de itens, seguro para uso entre threads (sessões do Streamlit)
+class CacheLRU:
+    def __init__(self, max_itens=128):
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            if chave in self.itens:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                return True, self.itens[chave]
+            self.falhas += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self.itens[chave] = valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self.itens.clear()
+            self.acertos = 0
+            self.falhas = 0
+
+
+# Cache compartilhado por todas as sessões: o módulo é importado uma vez por processo do Streamlit
+cache_global = CacheLRU(int(os.environ.get('FINANCE_CACHE_ITENS', 256)))
+
+
+# Decorador que memoriza o resultado pela impressão digital dos dados e pelos parâmetros.
+# O valor retornado é compartilhado entre chamadas e não deve ser modificado por quem chama.
+def memorizar(func=None, cache=None):
+    if func is None:
+        return functools.partial(memorizar, cache=cache)
+
+    @functools.wraps(func)
+    def envoltorio(*args, **kwargs):
+        alvo = cache if cache is not None else cache_global
+        chave = (func.__module__, func.__qualname__, _chave_argumento(args), _chave_argumento(kwargs))
+        encontrado, valor = alvo.obter(chave)
+        if encontrado:
+            return valor
+        valor = func(*args, **kwargs)
+        alvo.guardar(chave, valor)
+        return valor
+
+    return envoltorio
@@ -0,0 +1,118 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+
+import pandas as pd
+
+import diagnostico
+import nucleo
+import universo
+
+
+# Converte valores numpy/pandas em tipos aceitos pelo json
+def _para_json(valor):
+    if isinstance(valor, dict):
+        return {str(k): _para_json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_para_json(v) for v in valor]
+    if isinstance(valor, pd.Series):
+        return _para_json(valor.to_dict())
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+
+# Lê as carteiras: cada arquivo de --tickers vira uma carteira com o nome do arquivo,
+# e --carteiras aponta para um JSON {"nome": ["TICKER1", "TICKER2", ...]}
+def ler_carteiras(arquivos_tickers, arquivo_carteiras):
+    carteiras = {}
+    for caminho in arquivos_tickers or []:
+        carteiras[os.path.splitext(os.path.basename(caminho))[0]] = universo.ler_tickers(caminho)
+    if arquivo_carteiras:
+        with open(arquivo_carteiras) as f:
+            carteiras.update({nome: [t.upper() for t in tickers] for nome, tickers in json.load(f).items()})
+    return carteiras
+
+
+# Grava os resultados de uma carteira em <saida>/<nome>/ (tabelas em Parquet, resumo em JSON)
+def gravar_resultado(diretorio, resultado, tickers, falhas):
+    os.makedirs(diretorio, exist_ok=True)
+    resumo = {
+        'tickers': resultado['tickers'],
+        'universo_grande': resultado['universo_grande'],
+        'sem_dados': [t for t in tickers if t not in resultado['tickers']],
+        'falhas': {t: falhas[t] for t in tickers if t in falhas},
+        'retorno_esperado': resultado['retorno_esperado'],
+    }
+
+    resultado['covariancia'].to_parquet(os.path.join(diretorio, 'covariancia.parquet'))
+    if 'fronteira' in resultado:
+        resultado['fronteira']['pontos'].to_parquet(os.path.join(diretorio, 'fronteira.parquet'))
+        resumo['pontos_descartados'] = resultado['fronteira']['descartados']
+        for chave in ('min_volatilidade', 'max_sharpe', 'tangente'):
+            resumo[chave] = resultado['fronteira'][chave]
+    if 'pesos_hrp' in resultado:
+        resumo['pesos_hrp'] = resultado['pesos_hrp']
+        resumo['excluidos'] = resultado['excluidos']
+    if 'previsoes' in resultado:
+        previsoes = pd.concat([p[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].assign(ticker=t) for t, p in resultado['previsoes'].items()])
+        previsoes.reset_index(drop=True).to_parquet(os.path.join(diretorio, 'previsoes.parquet'))
+
+    with open(os.path.join(diretorio, 'resumo.json'), 'w') as f:
+        json.dump(_para_json(resumo), f, indent=2, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análise de portfólio em lote, sem interface gráfica.")
+    parser.add_argument('--tickers', action='append', help="Arquivo com a lista de tickers de uma carteira (pode repetir)")
+    parser.add_argument('--carteiras', help="Arquivo JSON com várias carteiras: {\"nome\": [\"TICKER\", ...]}")
+    parser.add_argument('--inicio', required=True, help="Data de início (AAAA-MM-DD)")
+    parser.add_argument('--fim', default=datetime.date.today().isoformat(), help="Data de fim (AAAA-MM-DD), padrão: hoje")
+    parser.add_argument('--saida', default='resultados', help="Diretório de saída")
+    parser.add_argument('--dias-previsao', type=int, default=0, help="Horizonte da previsão com Prophet (0 desliga)")
+    parser.add_argument('--taxa-livre-risco', type=float, default=0.0, help="Taxa livre de risco anual do portfólio tangente")
+    parser.add_argument('--pontos', type=int, default=50, help="Número de pontos da fronteira eficiente")
+    parser.add_argument('--diagnostico', help="Arquivo JSON onde gravar tempo, memória e chamadas de cada etapa")
+    parser.add_argument('--medir-memoria', action='store_true', help="Mede a memória de cada etapa com tracemalloc (mais lento)")
+    args = parser.parse_args(argv)
+
+    carteiras = ler_carteiras(args.tickers, args.carteiras)
+    if not carteiras:
+        parser.error("informe ao menos uma carteira com --tickers ou --carteiras")
+    if args.medir_memoria:
+        diagnostico.ativar_memoria()
+
+    # Os preços de todos os tickers são carregados uma única vez e compartilhados entre as carteiras
+    todos = list(dict.fromkeys(t for tickers in carteiras.values() for t in tickers))
+    precos, falhas, tempos = nucleo.carregar_precos(todos, args.inicio, args.fim)
+    print(f"{precos.shape[1]} de {len(todos)} tickers carregados em {max(tempos.values(), default=0):.1f}s")
+    for t, erro in falhas.items():
+        print(f"Erro ao obter os dados de {t}: {erro}", file=sys.stderr)
+
+    erros = 0
+    for nome, tickers in carteiras.items():
+        try:
+            resultado = nucleo.analisar_carteira(precos, tickers, taxa_livre_risco=args.taxa_livre_risco,
+                                                 n_pontos=args.pontos, dias_previsao=args.dias_previsao)
+        except ValueError as e:
+            print(f"[{nome}] {e}", file=sys.stderr)
+            erros += 1
+            continue
+        gravar_resultado(os.path.join(args.saida, nome), resultado, tickers, falhas)
+        if resultado.get('fronteira', {}).get('descartados'):
+            print(f"[{nome}] {resultado['fronteira']['descartados']} de {args.pontos} pontos da fronteira não convergiram", file=sys.stderr)
+        print(f"[{nome}] {len(resultado['tickers'])} ativos -> {os.path.join(args.saida, nome)}")
+        if resultado.get('excluidos'):
+            print(f"[{nome}] {len(resultado['excluidos'])} ativos com poucos preços fora da alocação HRP: {', '.join(resultado['excluidos'])}", file=sys.stderr)
+
+    if args.diagnostico:
+        with open(args.diagnostico, 'w') as f:
+            f.write(diagnostico.registro.exportar_json())
+
+    return 1 if erros == len(carteiras) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import datetime
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from diagnostico import medir
+
+
+# Série vazia com índice de datas, para que os filtros por intervalo continuem funcionando
+def serie_vazia(nome):
+    return pd.Series(dtype=float, index=pd.DatetimeIndex([]), name=nome)
+
+
+# Interface para as fontes de dados de preços (Yahoo, CSV local, fixtures de teste...)
+class FonteDados:
+    # Retorna a série de preços ajustados do ticker no intervalo [inicio, fim).
+    # Uma série vazia significa que não há preços no intervalo; falhas da busca devem levantar exceção,
+    # para que o armazém não marque o intervalo como coberto.
+    def obter(self, ticker, inicio, fim):
+        raise NotImplementedError
+
+
+# Fonte que busca os preços no Yahoo Finance.
+# Usa yf.Ticker em vez de yf.download (pdr_override), que guarda estado global e não pode ser chamado em paralelo.
+# Erros de rede e de limite de requisições precisam chegar como exceção em vez de um DataFrame vazio: o yfinance 1.x
+# controla isso por yf.config.debug.hide_exceptions (o parâmetro raise_errors de history() está obsoleto),
+# e as versões anteriores, sem yf.config, ainda usam raise_errors.
+class FonteYahoo(FonteDados):
+    def obter(self, ticker, inicio, fim):
+        import yfinance as yf
+        from yfinance.exceptions import YFPricesMissingError
+        opcoes = {}
+        if hasattr(yf, 'config'):
+            yf.config.debug.hide_exceptions = False
+        else:
+            opcoes['raise_errors'] = True
+        try:
+            dados = yf.Ticker(ticker).history(start=inicio, end=fim, auto_adjust=False, **opcoes)
+        except YFPricesMissingError:  # Nenhum pregão no intervalo (fim de semana, ativo ainda não listado...)
+            return serie_vazia('Adj Close')
+        if dados.empty:
+            return serie_vazia('Adj Close')
+        dados.index = dados.index.tz_localize(None)
+        return dados['Adj Close']
+
+
+# Fonte que lê os preços de arquivos CSV locais (um arquivo <ticker>.csv por ativo)
+class FonteCSV(FonteDados):
+    def __init__(self, diretorio, coluna='Adj Close'):
+        self.diretorio = diretorio
+        self.coluna = coluna
+
+    def obter(self, ticker, inicio, fim):
+        caminho = os.path.join(self.diretorio, f"{ticker}.csv")
+        if not os.path.exists(caminho):
+            return serie_vazia(self.coluna)
+        dados = pd.read_csv(caminho, index_col=0, parse_dates=True)[self.coluna]
+        return dados[(dados.index >= pd.Timestamp(inicio)) & (dados.index < pd.Timestamp(fim))]
+
+
+# Armazém local de preços em Parquet, com um arquivo por ticker e busca apenas dos intervalos que faltam
+class ArmazemPrecos:
+    def __init__(self, diretorio, fonte=None):
+        self.diretorio = diretorio
+        self.fonte = fonte if fonte is not None else FonteYahoo()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, ticker, extensao):
+        return os.path.join(self.diretorio, f"{ticker}.{extensao}")
+
+    # Intervalo [inicio, fim) já coberto no disco para o ticker, ou None
+    def cobertura(self, ticker):
+        caminho = self._caminho(ticker, 'json')
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho) as f:
+            meta = json.load(f)
+        return pd.Timestamp(meta['inicio']), pd.Timestamp(meta['fim'])
+
+    def _ler(self, ticker):
+        caminho = self._caminho(ticker, 'parquet')
+        if not os.path.exists(caminho):
+            return serie_vazia(ticker)
+        return pd.read_parquet(caminho)[ticker]
+
+    # Publica o arquivo de forma atômica: escreve em um temporário próprio desta gravação e faz os.replace.
+    # O nome único evita que duas sessões gravando o mesmo ticker escrevam no mesmo temporário.
+    def _publicar(self, caminho, escrever):
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, prefix=os.path.basename(caminho) + '.', suffix='.tmp')
+        os.close(descritor)
+        try:
+            escrever(temporario)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.remove(temporario)
+            raise
+
+    # Grava os preços e a cobertura; a cobertura vem depois, para nunca apontar para preços que não estão no disco
+    def _gravar(self, ticker, serie, inicio, fim):
+        self._publicar(self._caminho(ticker, 'parquet'), serie.to_frame(ticker).to_parquet)
+
+        def escrever_cobertura(caminho):
+            with open(caminho, 'w') as f:
+                json.dump({'inicio': inicio.isoformat(), 'fim': fim.isoformat()}, f)
+        self._publicar(self._caminho(ticker, 'json'), escrever_cobertura)
+
+    # Intervalos [inicio, fim) que ainda precisam ser buscados na fonte
+    def intervalos_faltantes(self, ticker, inicio, fim):
+        cobertura = self.cobertura(ticker)
+        if cobertura is None:
+            return [(inicio, fim)]
+        coberto_inicio, coberto_fim = cobertura
+        faltantes = []
+        if inicio < coberto_inicio:
+            faltantes.append((inicio, coberto_inicio))
+        if fim > coberto_fim:
+            faltantes.append((coberto_fim, fim))
+        return faltantes
+
+    # Busca os intervalos faltantes, cada um estendido até o pregão vizinho já gravado.
+    # Retorna as partes novas, ou None se o preço desse pregão mudou: a fonte reajustou o histórico
+    # (dividendo, desdobramento) e os preços gravados estão em outra escala.
+    def _buscar_faltantes(self, ticker, serie, faltantes):
+        partes = []
+        for a, b in faltantes:
+            if len(serie) > 0:
+                if a >= serie.index[-1]:
+                    a = serie.index[-1]
+                elif b <= serie.index[0]:
+                    b = serie.index[0] + pd.Timedelta(days=1)
+            parte = self.fonte.obter(ticker, a, b).rename(ticker).astype(float)
+            comuns = parte.index.intersection(serie.index)
+            if not np.allclose(parte[comuns], serie[comuns], rtol=1e-6, atol=0.0, equal_nan=True):
+                return None
+            partes.append(parte)
+        return partes
+
+    # Retorna os preços do ticker no intervalo [inicio, fim), buscando na fonte apenas o que falta
+    def carregar(self, ticker, inicio, fim):
+        inicio = pd.Timestamp(inicio)
+        fim = pd.Timestamp(fim)
+        # O pregão do dia corrente ainda pode mudar, então a cobertura nunca passa de hoje
+        fim_cobertura = min(fim, pd.Timestamp(datetime.date.today()))
+
+        serie = self._ler(ticker)
+        faltantes = self.intervalos_faltantes(ticker, inicio, fim)
+        if faltantes:
+            cobertura = self.cobertura(ticker)
+            novo_inicio = min(inicio, cobertura[0]) if cobertura else inicio
+            novo_fim = max(fim_cobertura, cobertura[1]) if cobertura else fim_cobertura
+
+            # Se alguma busca falhar, a exceção sai antes da gravação e a cobertura não avança
+            partes = self._buscar_faltantes(ticker, serie, faltantes)
+            if partes is None:
+                # Histórico reajustado: descarta o que está gravado e busca todo o intervalo de novo
+                serie = serie_vazia(ticker)
+                partes = [self.fonte.obter(ticker, novo_inicio, max(fim, novo_fim)).rename(ticker).astype(float)]
+            partes = [p for p in [serie] + partes if len(p) > 0]
+            if partes:
+                serie = pd.concat(partes)
+                serie = serie[~serie.index.duplicated(keep='last')].sort_index()
+
+            if novo_fim > novo_inicio:
+                # Só é gravado o que está dentro da cobertura; o pregão de hoje é buscado de novo na próxima vez
+                self._gravar(ticker, serie[serie.index < novo_fim], novo_inicio, novo_fim)
+
+        return serie[(serie.index >= inicio) & (serie.index < fim)]
+
+
+# Cria o armazém padrão: diretório em FINANCE_DADOS_DIR e, se FINANCE_FONTE_CSV estiver definido, usa CSVs locais
+def armazem_padrao():
+    diretorio = os.environ.get('FINANCE_DADOS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_precos'))
+    fonte_csv = os.environ.get('FINANCE_FONTE_CSV')
+    fonte = FonteCSV(fonte_csv) if fonte_csv else FonteYahoo()
+    return ArmazemPrecos(diretorio, fonte)
+
+
+# Carrega um ticker com novas tentativas; retorna (série ou None, erro ou None, tempo em segundos)
+def _baixar_ticker(armazem, ticker, inicio, fim, tentativas, espera):
+    comeco = time.perf_counter()
+    erro = None
+    for tentativa in range(tentativas):
+        try:
+            return armazem.carregar(ticker, inicio, fim), None, time.perf_counter() - comeco
+        except Exception as e:
+            erro = e
+            if tentativa < tentativas - 1:
+                time.sleep(espera * 2 ** tentativa)
+    return None, erro, time.perf_counter() - comeco
+
+
+# Baixa os tickers em paralelo e monta a matriz de preços alinhada de uma só vez.
+# Retorna (precos, falhas, tempos): falhas mapeia ticker -> mensagem de erro e tempos mapeia ticker -> segundos.
+@medir('download')
+def baixar_precos(armazem, tickers, inicio, fim, max_workers=8, tentativas=3, espera=0.5):
+    tickers = list(dict.fromkeys(tickers))
+    falhas = {}
+    tempos = {}
+    series = []
+    if not tickers:
+        return pd.DataFrame(), falhas, tempos
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as executor:
+        resultados = executor.map(lambda t: _baixar_ticker(armazem, t, inicio, fim, tentativas, espera), tickers)
+        for t, (serie, erro, tempo) in zip(tickers, resultados):
+            tempos[t] = tempo
+            if erro is not None:
+                falhas[t] = str(erro)
+            elif len(serie) == 0:  # Ativo sem dados no período também é reportado, em vez de sumir da matriz
+                falhas[t] = "Nenhum dado disponível no período"
+            else:
+                series.append(serie.rename(t))
+
+    precos = pd.concat(series, axis=1) if series else pd.DataFrame()
+    return precos, falhas, tempos
@@ -0,0 +1,114 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+# Registro de tempo, memória e número de chamadas por etapa (download, retornos, covariância...).
+# É um único registro por processo, então agrega as execuções de todas as sessões do Streamlit.
+# A memória só é medida depois que o tracemalloc é ligado (ver ativar_memoria), pois ele tem custo.
+class Registro:
+    def __init__(self):
+        self.etapas = {}
+        self._trava = threading.Lock()
+        self._local = threading.local()
+
+    def _pilha(self):
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+        return self._local.pilha
+
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        pilha = self._pilha()
+        memoria = tracemalloc.is_tracing()
+        if memoria:
+            # O pico do tracemalloc é global: guarda o pico da etapa externa antes de zerá-lo para esta
+            atual, pico = tracemalloc.get_traced_memory()
+            if pilha:
+                pilha[-1]['pico'] = max(pilha[-1]['pico'], pico)
+            tracemalloc.reset_peak()
+            pilha.append({'inicio': atual, 'pico': atual})
+        comeco = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - comeco
+            pico_mb = None
+            if memoria and tracemalloc.is_tracing():
+                quadro = pilha.pop()
+                pico = max(quadro['pico'], tracemalloc.get_traced_memory()[1])
+                if pilha:
+                    pilha[-1]['pico'] = max(pilha[-1]['pico'], pico)
+                tracemalloc.reset_peak()
+                pico_mb = (pico - quadro['inicio']) / 2 ** 20
+            self.registrar(nome, duracao, pico_mb)
+
+    # Soma uma execução à etapa; também usado para tempos medidos em outros processos
+    def registrar(self, nome, duracao, pico_mb=None):
+        with self._trava:
+            e = self.etapas.setdefault(nome, {'chamadas': 0, 'tempo_total': 0.0, 'tempo_max': 0.0, 'ultimo_tempo': 0.0, 'memoria_pico_mb': None})
+            e['chamadas'] += 1
+            e['tempo_total'] += duracao
+            e['tempo_max'] = max(e['tempo_max'], duracao)
+            e['ultimo_tempo'] = duracao
+            if pico_mb is not None:
+                e['memoria_pico_mb'] = max(e['memoria_pico_mb'] or 0.0, pico_mb)
+
+    # Tabela com uma linha por etapa, ordenada pelo tempo total
+    def resumo(self):
+        with self._trava:
+            tabela = pd.DataFrame.from_dict({nome: dict(e) for nome, e in self.etapas.items()}, orient='index')
+        if tabela.empty:
+            return tabela
+        tabela['tempo_medio'] = tabela['tempo_total'] / tabela['chamadas']
+        return tabela.sort_values('tempo_total', ascending=False)
+
+    def exportar_json(self):
+        with self._trava:
+            return json.dumps({'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'), 'etapas': self.etapas}, indent=2, ensure_ascii=False)
+
+    def limpar(self):
+        with self._trava:
+            self.etapas.clear()
+
+
+registro = Registro()
+
+
+# Bloco medido: `with etapa('covariancia'): ...`
+def etapa(nome):
+    return registro.etapa(nome)
+
+
+# Decorador que mede cada chamada da função como a etapa `nome`
+def medir(nome):
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            with registro.etapa(nome):
+                return func(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+# Liga a medição de memória (tracemalloc deixa o código bem mais lento enquanto está ativo).
+# O tracemalloc é do processo inteiro, e no Streamlit o processo é compartilhado por todas as sessões;
+# por isso a medição só é ligada, nunca desligada, para não apagar a medição que outra sessão pediu.
+def ativar_memoria():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def memoria_ativa():
+    return tracemalloc.is_tracing()
+
+
+# FINANCE_DIAGNOSTICO_MEMORIA liga a medição desde o início do processo
+if os.environ.get('FINANCE_DIAGNOSTICO_MEMORIA'):
+    ativar_memoria()
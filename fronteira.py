@@ -0,0 +1,89 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from pypfopt import efficient_frontier, exceptions, risk_models
+
+
+# Limites do OSQP para a nova tentativa de um alvo que parou no limite de iterações (status user_limit)
+# ou terminou com solução imprecisa na varredura com warm start
+OPCOES_NOVA_TENTATIVA = {'max_iter': 100000, 'eps_abs': 1e-9, 'eps_rel': 1e-9}
+
+
+def _resolver_alvo(ef, alvo, tipo):
+    if tipo == 'retorno':
+        return ef.efficient_return(target_return=float(alvo))
+    return ef.efficient_risk(target_volatility=float(alvo))
+
+
+# Resolve a grade de alvos com uma única instância de EfficientFrontier.
+# O alvo é um parâmetro do cvxpy, então o problema é compilado uma vez e cada alvo seguinte
+# reaproveita a solução do vizinho anterior como ponto de partida (warm start).
+# Um alvo que não converge é resolvido de novo em uma instância nova com limites maiores;
+# retorna (pontos, número de alvos descartados mesmo assim).
+def _resolver_alvos(retorno, matriz, alvos, tipo, limites):
+    ef = efficient_frontier.EfficientFrontier(retorno, matriz, weight_bounds=limites, solver_options={'warm_start': True})
+    pontos = []
+    descartados = 0
+    for alvo in alvos:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)  # Solução imprecisa: tratada abaixo com a nova tentativa
+                pesos = _resolver_alvo(ef, alvo, tipo)
+            resolvido = ef if ef._opt.status == 'optimal' else None
+        except (ValueError, exceptions.OptimizationError):
+            resolvido = None
+        if resolvido is None:
+            resolvido = efficient_frontier.EfficientFrontier(retorno, matriz, weight_bounds=limites, solver='OSQP',
+                                                             solver_options=OPCOES_NOVA_TENTATIVA)
+            try:
+                pesos = _resolver_alvo(resolvido, alvo, tipo)
+            except (ValueError, exceptions.OptimizationError):
+                descartados += 1  # Alvo inatingível ou sem convergência: o ponto fica fora da fronteira
+                continue
+        r, v, s = resolvido.portfolio_performance()
+        pontos.append({'retorno': r, 'volatilidade': v, 'sharpe': s, **pesos})
+    return pontos, descartados
+
+
+# Calcula um ponto especial da fronteira (mínima volatilidade ou máximo Sharpe), ou None se não houver solução
+def _ponto_especial(retorno, matriz, limites, metodo, **kwargs):
+    ef = efficient_frontier.EfficientFrontier(retorno, matriz, weight_bounds=limites)
+    try:
+        pesos = getattr(ef, metodo)(**kwargs)
+    except (ValueError, exceptions.OptimizationError):
+        return None
+    r, v, s = ef.portfolio_performance(risk_free_rate=kwargs.get('risk_free_rate', 0.0))
+    return {'retorno': r, 'volatilidade': v, 'sharpe': s, **pesos}
+
+
+# Varre a fronteira eficiente inteira para os mesmos retornos esperados e covariância.
+# tipo='retorno' usa uma grade de retornos alvo e tipo='risco' uma grade de volatilidades alvo.
+# Retorna um dict com 'pontos' (DataFrame com desempenho e pesos de cada ponto), 'descartados' (alvos sem
+# solução), 'min_volatilidade', 'max_sharpe' (taxa livre de risco zero) e 'tangente' (taxa livre de risco informada).
+def calcular_fronteira(retorno, matriz, n_pontos=50, tipo='retorno', taxa_livre_risco=0.0, limites=(0, 1)):
+    # A matriz é corrigida para semidefinida positiva uma única vez, e não a cada EfficientFrontier
+    matriz = risk_models.fix_nonpositive_semidefinite(matriz)
+
+    min_vol = _ponto_especial(retorno, matriz, limites, 'min_volatility')
+    if min_vol is None:
+        raise ValueError("Não foi possível calcular o portfólio de mínima volatilidade.")
+    max_sharpe = _ponto_especial(retorno, matriz, limites, 'max_sharpe')
+    tangente = max_sharpe if taxa_livre_risco == 0.0 else _ponto_especial(retorno, matriz, limites, 'max_sharpe', risk_free_rate=taxa_livre_risco)
+
+    # A parte eficiente da fronteira vai do portfólio de mínima volatilidade até o de maior retorno.
+    # O topo da grade fica um pouco abaixo do máximo calculado pelo próprio solver, pois efficient_return
+    # rejeita alvos acima dele e retorno.max() pode ultrapassá-lo por erro numérico.
+    if tipo == 'retorno':
+        max_retorno = efficient_frontier.EfficientFrontier(retorno, matriz, weight_bounds=limites)._max_return()
+        max_retorno = min(max_retorno, retorno.max()) - 1e-6 * abs(max_retorno)
+        alvos = np.linspace(min_vol['retorno'], max_retorno, n_pontos)
+    else:
+        alvos = np.linspace(min_vol['volatilidade'], np.sqrt(np.diag(matriz)).max(), n_pontos)
+
+    pontos, descartados = _resolver_alvos(retorno, matriz, alvos, tipo, limites)
+    pontos = pd.DataFrame(pontos)
+    if not pontos.empty:
+        pontos = pontos.sort_values('volatilidade').reset_index(drop=True)
+
+    return {'pontos': pontos, 'descartados': descartados, 'min_volatilidade': min_vol, 'max_sharpe': max_sharpe, 'tangente': tangente}
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from cache import memorizar
+from diagnostico import medir
+
+# Pontos por série enviados ao navegador: cerca de dois por pixel de um gráfico na largura padrão
+PONTOS_POR_SERIE = 1500
+
+
+# Largest-Triangle-Three-Buckets: escolhe n índices de (x, y) preservando picos, vales e a forma da curva.
+# y pode ter várias colunas com o mesmo x; o laço sobre os baldes é feito uma vez para todas elas
+# e o resultado tem uma coluna de índices por série.
+def lttb(x, y, n):
+    total = len(x)
+    y = np.asarray(y, dtype=np.float64).reshape(total, -1)
+    if n >= total or n < 3:
+        return np.repeat(np.arange(total)[:, None], y.shape[1], axis=1)
+
+    # Limites dos baldes e médias do balde seguinte (somas acumuladas, sem laço)
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    limites = np.append((np.arange(n - 1) * ((total - 2) / (n - 2))).astype(np.int64) + 1, total)
+    soma_x = np.concatenate([[0.0], np.cumsum(x)])
+    soma_y = np.vstack([np.zeros((1, y.shape[1])), np.cumsum(y, axis=0)])
+    tamanhos = (limites[2:] - limites[1:-1])[:, None]
+    medias_x = (soma_x[limites[2:]] - soma_x[limites[1:-1]]) / tamanhos[:, 0]
+    medias_y = (soma_y[limites[2:]] - soma_y[limites[1:-1]]) / tamanhos
+
+    colunas = np.arange(y.shape[1])
+    indices = np.empty((n, y.shape[1]), dtype=np.int64)
+    indices[0] = 0
+    a = indices[0]
+    for i in range(n - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        xa, ya = x[a], y[a, colunas]
+        areas = np.abs((xa - medias_x[i]) * (y[inicio:fim] - ya) - (xa - x[inicio:fim, None]) * (medias_y[i] - ya))
+        a = inicio + np.argmax(areas, axis=0)
+        indices[i + 1] = a
+    indices[-1] = total - 1
+    return indices
+
+
+# Recorta a série (ou DataFrame) ao intervalo visível [inicio, fim]
+def _recortar(dados, inicio, fim):
+    if inicio is not None:
+        dados = dados[dados.index >= pd.Timestamp(inicio)]
+    if fim is not None:
+        dados = dados[dados.index <= pd.Timestamp(fim)]
+    return dados
+
+
+def _eixo_x(indice):
+    return indice.asi8.astype(np.float64) if isinstance(indice, pd.DatetimeIndex) else np.arange(len(indice), dtype=np.float64)
+
+
+# Série reduzida para o intervalo visível [inicio, fim], com no máximo n_pontos pontos
+@memorizar
+def reduzir_serie(serie, n_pontos=PONTOS_POR_SERIE, inicio=None, fim=None):
+    serie = _recortar(serie.dropna(), inicio, fim)
+    if len(serie) <= n_pontos:
+        return serie
+    return serie.iloc[lttb(_eixo_x(serie.index), serie.to_numpy(dtype=np.float64), n_pontos)[:, 0]]
+
+
+# Reduz todas as colunas de um DataFrame; as colunas sem lacunas no intervalo são processadas juntas
+# em uma única passada do LTTB. Retorna um dict coluna -> série reduzida.
+@memorizar
+def reduzir_dados(dados, n_pontos=PONTOS_POR_SERIE, inicio=None, fim=None):
+    dados = _recortar(dados, inicio, fim)
+    completas = [c for c in dados.columns if not dados[c].isna().any()]
+    reduzidas = {c: reduzir_serie(dados[c], n_pontos) for c in dados.columns if c not in completas}
+    if completas:
+        if len(dados) <= n_pontos:
+            reduzidas.update({c: dados[c] for c in completas})
+        else:
+            indices = lttb(_eixo_x(dados.index), dados[completas].to_numpy(dtype=np.float64), n_pontos)
+            reduzidas.update({c: dados[c].iloc[indices[:, j]] for j, c in enumerate(completas)})
+    return {c: reduzidas[c] for c in dados.columns}
+
+
+# Adiciona uma linha WebGL (Scattergl) com a série já reduzida ao orçamento de pontos
+def adicionar_serie(fig, serie, nome, n_pontos=PONTOS_POR_SERIE, intervalo=(None, None), **kwargs):
+    reduzida = reduzir_serie(serie, n_pontos, *intervalo)
+    fig.add_trace(go.Scattergl(x=reduzida.index, y=reduzida.values, mode='lines', name=nome, **kwargs))
+
+
+# Gráfico de linhas com uma série por coluna, reduzidas pelo LTTB para o intervalo visível
+@medir('graficos.series')
+def figura_series(dados, titulo, eixo_y, nomes=None, n_pontos=PONTOS_POR_SERIE, intervalo=(None, None)):
+    fig = go.Figure()
+    for coluna, reduzida in reduzir_dados(dados, n_pontos, *intervalo).items():
+        fig.add_trace(go.Scattergl(x=reduzida.index, y=reduzida.values, mode='lines', name=(nomes or {}).get(coluna, coluna)))
+    fig.update_layout(title_text=titulo, xaxis_title="Data", yaxis_title=eixo_y)
+    return fig
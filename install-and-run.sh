@@ -7,7 +7,7 @@ sudo apt-get install python3-pip
 
 # Install required dependencies
 echo "Installing required dependencies..."
-pip3 install pandas numpy matplotlib seaborn yfinance pandas_datareader pypfopt streamlit plotly ephem pystan fbprophet
+pip3 install pandas numpy pyarrow matplotlib seaborn yfinance pandas_datareader pypfopt streamlit plotly ephem pystan fbprophet
 
 # Cloning from git
 git clone https://github.com/duzaao/Finance.git
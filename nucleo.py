@@ -0,0 +1,40 @@
+import numpy as np
+
+import analise
+from dados import armazem_padrao, baixar_precos
+
+# Acima deste número de ativos a análise passa para o modo universo grande (shrinkage + HRP)
+LIMITE_UNIVERSO_GRANDE = 100
+
+
+# Carrega a matriz de preços dos tickers; retorna (precos, falhas, tempos) como dados.baixar_precos
+def carregar_precos(tickers, inicio, fim, armazem=None):
+    return baixar_precos(armazem if armazem is not None else armazem_padrao(), tickers, inicio, fim)
+
+
+# Executa a análise completa de uma carteira sem interface: retornos, covariância, otimização e previsões.
+# precos pode conter mais ativos que a carteira; apenas as colunas de `tickers` são usadas.
+def analisar_carteira(precos, tickers=None, taxa_livre_risco=0.0, n_pontos=50, dias_previsao=0):
+    if tickers is not None:
+        precos = precos[[t for t in tickers if t in precos.columns]]
+    precos = precos.dropna(axis=1, how='all').dropna(how='all')
+    if precos.empty:
+        raise ValueError("Nenhum dado disponível para os ativos da carteira.")
+
+    resultado = {'tickers': list(precos.columns), 'universo_grande': precos.shape[1] > LIMITE_UNIVERSO_GRANDE}
+    resultado['retorno_esperado'] = analise.retorno_esperado(precos)
+
+    if resultado['universo_grande']:
+        universo = analise.universo_grande(precos.astype(np.float32))
+        resultado['covariancia'] = universo.covariancia()
+        resultado['pesos_hrp'] = universo.pesos_hrp()
+        resultado['excluidos'] = universo.excluidos  # Poucos preços no período: fora da covariância e do HRP
+    else:
+        resultado['covariancia'] = analise.matriz_covariancia(precos)
+        resultado['fronteira'] = analise.fronteira_eficiente(precos, n_pontos=n_pontos, taxa_livre_risco=taxa_livre_risco)
+
+    if dias_previsao > 0:
+        import previsao  # Prophet só é carregado quando há previsão
+        resultado['previsoes'] = previsao.prever_lote(precos, dias_previsao)
+
+    return resultado
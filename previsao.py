@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+from cache import CacheLRU, impressao_digital
+from diagnostico import etapa, medir, registro
+
+# Modelos Prophet ajustados, chaveados pela impressão digital da série (que inclui o ticker)
+cache_modelos = CacheLRU(int(os.environ.get('FINANCE_CACHE_MODELOS', 32)))
+
+
+# Converte a série de preços de um ticker no formato esperado pelo Prophet (colunas ds e y)
+def _para_prophet(serie):
+    dados = serie.dropna().reset_index()
+    dados.columns = ['ds', 'y']
+    return dados
+
+
+def _ajustar(serie):
+    model = Prophet(daily_seasonality=True)
+    model.fit(_para_prophet(serie))
+    return model
+
+
+# Executado nos processos do lote: o modelo volta serializado em JSON, pois o objeto não é enviado entre processos.
+# O registro de diagnóstico do processo filho se perde com ele, então a duração do ajuste volta junto.
+def _ajustar_json(serie):
+    comeco = time.perf_counter()
+    model = _ajustar(serie)
+    return model_to_json(model), time.perf_counter() - comeco
+
+
+# Chave do cache: a série sem lacunas, que é o que o Prophet recebe. Assim a mesma série vinda de uma
+# matriz de preços com outro índice (outros ativos carregados juntos) reaproveita o modelo.
+def _chave(serie):
+    return ('prophet', impressao_digital(serie.dropna()))
+
+
+# Retorna o modelo ajustado para a série, reaproveitando o ajuste se os dados não mudaram
+def ajustar_modelo(serie):
+    chave = _chave(serie)
+    encontrado, model = cache_modelos.obter(chave)
+    if not encontrado:
+        with etapa('previsao.ajuste'):
+            model = _ajustar(serie)
+        cache_modelos.guardar(chave, model)
+    return model
+
+
+# Previsão dos próximos num_dias para a série; só o predict é refeito quando muda apenas o horizonte
+def prever(serie, num_dias):
+    if num_dias <= 0:
+        return None
+    model = ajustar_modelo(serie)
+    futuras_datas = model.make_future_dataframe(periods=num_dias)
+    with etapa('previsao.predict'):
+        return model.predict(futuras_datas).tail(num_dias)
+
+
+# Ajusta em paralelo os modelos de todas as colunas de precos que ainda não estão no cache
+# e retorna um dict ticker -> previsão dos próximos num_dias
+@medir('previsao.lote')
+def prever_lote(precos, num_dias, processos=None):
+    pendentes = [t for t in precos.columns if not cache_modelos.obter(_chave(precos[t]))[0]]
+    if len(pendentes) > 1:
+        processos = min(processos or os.cpu_count() or 1, len(pendentes))
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            modelos = executor.map(_ajustar_json, [precos[t] for t in pendentes])
+            for t, (modelo_json, duracao) in zip(pendentes, modelos):
+                registro.registrar('previsao.ajuste', duracao)
+                cache_modelos.guardar(_chave(precos[t]), model_from_json(modelo_json))
+
+    return {t: prever(precos[t], num_dias) for t in precos.columns}
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from dados import ArmazemPrecos, FonteDados
+
+
+# Fonte de teste com preços fixos por data; `fator` simula o reajuste do histórico (dividendo, desdobramento)
+class FonteFalsa(FonteDados):
+    def __init__(self, precos):
+        self.precos = precos
+        self.fator = 1.0
+        self.chamadas = []
+
+    def obter(self, ticker, inicio, fim):
+        self.chamadas.append((pd.Timestamp(inicio), pd.Timestamp(fim)))
+        serie = self.precos * self.fator
+        return serie[(serie.index >= pd.Timestamp(inicio)) & (serie.index < pd.Timestamp(fim))]
+
+
+def _precos():
+    datas = pd.bdate_range('2023-01-02', '2023-03-31')
+    return pd.Series(range(100, 100 + len(datas)), index=datas, dtype=float)
+
+
+def test_carrega_apenas_o_intervalo_faltante(tmp_path):
+    fonte = FonteFalsa(_precos())
+    armazem = ArmazemPrecos(str(tmp_path), fonte)
+    armazem.carregar('X', '2023-01-02', '2023-02-01')
+    serie = armazem.carregar('X', '2023-01-02', '2023-03-01')
+
+    assert fonte.chamadas[-1][1] == pd.Timestamp('2023-03-01')
+    assert fonte.chamadas[-1][0] < pd.Timestamp('2023-02-01')  # Inclui o último pregão já gravado
+    pd.testing.assert_series_equal(serie, _precos()['2023-01-02':'2023-02-28'].rename('X'), check_freq=False)
+
+
+def test_historico_reajustado_e_baixado_de_novo(tmp_path):
+    fonte = FonteFalsa(_precos())
+    armazem = ArmazemPrecos(str(tmp_path), fonte)
+    armazem.carregar('X', '2023-01-02', '2023-02-01')
+
+    # Desdobramento 2:1 entre as duas chamadas: a fonte passa a devolver todo o histórico pela metade
+    fonte.fator = 0.5
+    serie = armazem.carregar('X', '2023-01-02', '2023-03-01')
+
+    esperado = (_precos() * 0.5)['2023-01-02':'2023-02-28'].rename('X')
+    pd.testing.assert_series_equal(serie, esperado, check_freq=False)
+    assert serie.pct_change().min() > 0  # Sem o falso retorno de -50% na emenda
+    pd.testing.assert_series_equal(armazem.carregar('X', '2023-01-02', '2023-03-01'), esperado, check_freq=False)
+
+
+def test_falha_na_busca_nao_avanca_a_cobertura(tmp_path):
+    class FonteComFalha(FonteDados):
+        def obter(self, ticker, inicio, fim):
+            raise ConnectionError("sem conexão")
+
+    armazem = ArmazemPrecos(str(tmp_path), FonteComFalha())
+    with pytest.raises(ConnectionError):
+        armazem.carregar('X', '2023-01-02', '2023-02-01')
+    assert armazem.cobertura('X') is None
+
+
+def test_gravacoes_simultaneas_do_mesmo_ticker(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    armazem = ArmazemPrecos(str(tmp_path), FonteFalsa(_precos()))
+    serie = _precos().rename('X')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: armazem._gravar('X', serie, serie.index[0], serie.index[-1]), range(64)))
+
+    pd.testing.assert_series_equal(armazem._ler('X'), serie, check_freq=False)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['X.json', 'X.parquet']
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from diagnostico import medir
+
+
+# Lê uma lista de tickers de um arquivo texto/CSV (um por linha ou separados por vírgula, ponto e vírgula ou espaço;
+# o que vem depois de # é comentário)
+def ler_tickers(arquivo):
+    if isinstance(arquivo, str):
+        with open(arquivo) as f:
+            texto = f.read()
+    else:
+        texto = arquivo.read()
+        if isinstance(texto, bytes):
+            texto = texto.decode('utf-8')
+    texto = '\n'.join(linha.split('#')[0] for linha in texto.splitlines())
+    for separador in (',', ';', '\t'):
+        texto = texto.replace(separador, ' ')
+    return list(dict.fromkeys(t.upper() for t in texto.split()))
+
+
+# Estimador de Ledoit-Wolf: encolhe a covariância amostral na direção de mu*I.
+# As somas de quarta ordem são calculadas linha a linha (O(T*N)), sem matrizes N x N extras.
+def covariancia_shrinkage(retornos):
+    T, N = retornos.shape
+    X = retornos - retornos.mean(axis=0)
+    amostral = (X.T @ X).astype(np.float64) / T
+    X2 = (X.astype(np.float64)) ** 2
+    traco = X2.sum() / T
+    mu = traco / N
+    beta_ = (X2.sum(axis=1) ** 2).sum()
+    delta_ = (amostral ** 2).sum()
+    beta = (beta_ / T - delta_) / (N * T)
+    delta = (delta_ - 2 * mu * traco + N * mu ** 2) / N
+    intensidade = 0.0 if beta <= 0 else min(beta, delta) / delta
+    encolhida = (1 - intensidade) * amostral
+    encolhida[np.diag_indices(N)] += intensidade * mu
+    return encolhida, intensidade
+
+
+# Pesos por paridade de risco hierárquica (HRP): bissecção recursiva sobre a ordem das folhas do cluster
+def _pesos_hrp(covariancia, ordem):
+    pesos = np.ones(len(ordem))
+    grupos = [np.asarray(ordem)]
+    variancia_inversa = 1 / np.diag(covariancia)
+    while grupos:
+        grupos = [g[i:j] for g in grupos for i, j in ((0, len(g) // 2), (len(g) // 2, len(g))) if len(g) > 1]
+        for esquerda, direita in zip(grupos[::2], grupos[1::2]):
+            variancias = []
+            for g in (esquerda, direita):
+                w = variancia_inversa[g] / variancia_inversa[g].sum()
+                variancias.append(w @ covariancia[np.ix_(g, g)] @ w)
+            alfa = 1 - variancias[0] / (variancias[0] + variancias[1])
+            pesos[esquerda] *= alfa
+            pesos[direita] *= 1 - alfa
+    return pesos
+
+
+# Universo grande de ativos: retornos guardados como float32, covariância com shrinkage e alocação HRP.
+# Covariância, clusterização e pesos são calculados uma única vez por instância e reaproveitados.
+class UniversoGrande:
+    def __init__(self, precos, min_observacoes=0.8, frequencia=252, metodo_ligacao='single'):
+        # Ativos com poucos preços no período (listados recentemente, suspensos...) ficam de fora
+        suficientes = precos.notna().mean() >= min_observacoes
+        self.excluidos = list(precos.columns[~suficientes])
+        precos = precos.loc[:, suficientes]
+        retornos = precos.pct_change().iloc[1:]
+        self.tickers = list(retornos.columns)
+        self.datas = retornos.index
+        self.frequencia = frequencia
+        self.metodo_ligacao = metodo_ligacao
+        self.retornos = retornos.fillna(0.0).to_numpy(dtype=np.float32)
+        self.intensidade_shrinkage = None
+        self._covariancia = None
+        self._ligacao = None
+        self._pesos = None
+
+    @medir('covariancia.shrinkage')
+    def _calcular_covariancia(self):
+        if self._covariancia is None:
+            covariancia, self.intensidade_shrinkage = covariancia_shrinkage(self.retornos)
+            self._covariancia = covariancia * self.frequencia
+        return self._covariancia
+
+    def covariancia(self):
+        return pd.DataFrame(self._calcular_covariancia(), index=self.tickers, columns=self.tickers)
+
+    # Matriz de ligação da clusterização hierárquica pela distância de correlação sqrt((1 - rho) / 2)
+    @medir('clusterizacao')
+    def ligacao(self):
+        if self._ligacao is None:
+            from scipy.cluster.hierarchy import linkage
+            from scipy.spatial.distance import squareform
+            covariancia = self._calcular_covariancia()
+            desvio = np.sqrt(np.diag(covariancia))
+            correlacao = np.clip(covariancia / np.outer(desvio, desvio), -1, 1)
+            distancia = np.sqrt((1 - correlacao) / 2)
+            self._ligacao = linkage(squareform(distancia, checks=False), self.metodo_ligacao)
+        return self._ligacao
+
+    @medir('otimizacao.hrp')
+    def pesos_hrp(self):
+        if self._pesos is None:
+            from scipy.cluster.hierarchy import leaves_list
+            ordem = leaves_list(self.ligacao())
+            self._pesos = pd.Series(_pesos_hrp(self._calcular_covariancia(), ordem), index=self.tickers)
+        return self._pesos
+
+    # Dendrograma da clusterização; com muitos ativos mostra apenas os últimos `max_folhas` clusters
+    def dendrograma(self, max_folhas=60):
+        import matplotlib.pyplot as plt
+        from scipy.cluster.hierarchy import dendrogram
+        fig, ax = plt.subplots(figsize=(12, 5))
+        if len(self.tickers) > max_folhas:
+            dendrogram(self.ligacao(), ax=ax, truncate_mode='lastp', p=max_folhas)
+        else:
+            dendrogram(self.ligacao(), ax=ax, labels=self.tickers, leaf_rotation=90)
+        ax.set_title("Dendrograma dos Ativos")
+        return fig